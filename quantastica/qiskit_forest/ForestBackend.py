@@ -12,6 +12,7 @@
 # that they have been altered from the originals.
 
 import uuid
+import threading
 
 from quantastica.qiskit_forest import ForestJob
 from qiskit.providers import BackendV2
@@ -48,13 +49,17 @@ class ForestBackend(BackendV2):
     def __init__(self, configuration=None,
                 provider=None,
                 lattice_name = None,
-                as_qvm = False):
+                as_qvm = False,
+                checkpoint_dir = None):
         configuration = configuration or BackendConfiguration.from_dict(
             self.DEFAULT_CONFIGURATION)
         super().__init__(configuration=configuration, provider=provider)
 
         self._lattice_name = lattice_name
         self._as_qvm = as_qvm
+        self._checkpoint_dir = checkpoint_dir
+        self._active_jobs = {}
+        self._jobs_lock = threading.Lock()
 
     #@profile
     def run(self, qobj):
@@ -64,10 +69,29 @@ class ForestBackend(BackendV2):
             job_id,
             qobj,
             lattice_name = self._lattice_name,
-            as_qvm = self._as_qvm)
-        job.submit()
+            as_qvm = self._as_qvm,
+            checkpoint_dir = self._checkpoint_dir)
+        # register before submit so finished job can't unregister too early
+        with self._jobs_lock:
+            self._active_jobs[job_id] = job
+        try:
+            job.submit()
+        except BaseException:
+            self._unregister_job(job)
+            raise
         return job
 
+    def active_jobs(self):
+        """
+        Returns list of jobs which still have queued or running experiments
+        """
+        with self._jobs_lock:
+            return list(self._active_jobs.values())
+
+    def _unregister_job(self, job):
+        with self._jobs_lock:
+            self._active_jobs.pop(job.job_id(), None)
+
 
     #@staticmethod
     def name(self):
@@ -77,5 +101,6 @@ class ForestBackend(BackendV2):
         return backend_name
 
 
-def get_backend(lattice_name = None, as_qvm = False):
-        return ForestBackend(lattice_name = lattice_name, as_qvm = as_qvm)
+def get_backend(lattice_name = None, as_qvm = False, checkpoint_dir = None):
+        return ForestBackend(lattice_name = lattice_name, as_qvm = as_qvm,
+            checkpoint_dir = checkpoint_dir)
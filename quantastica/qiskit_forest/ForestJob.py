@@ -15,6 +15,11 @@ from concurrent import futures
 import logging
 import time
 import copy
+import os
+import json
+import hashlib
+import threading
+import shutil
 
 from quantastica import qconvert
 from qiskit.providers import JobV1, JobStatus, JobError
@@ -37,6 +42,7 @@ def _run_with_rigetti_static(qobj_dict, shots, lattice_name, as_qvm, job_id):
     seed = None
     if SEED_SIMULATOR_KEY in qobj_dict['config']:
         seed =  qobj_dict['config'][SEED_SIMULATOR_KEY]
+    memory = qobj_dict['config'].get('memory', False)
 
     conversion_options = { "all_experiments": False,
         "create_exec_code": False,
@@ -77,9 +83,11 @@ def _run_with_rigetti_static(qobj_dict, shots, lattice_name, as_qvm, job_id):
     else:
         ex=global_vars['ex']
 
-        counts=qc.run(ex)
-        counts = ForestJob._convert_counts(counts)
+        shot_results=qc.run(ex)
+        counts = ForestJob._convert_counts(shot_results)
         data = { "counts": counts }
+        if memory:
+            data["memory"] = ForestJob._convert_memory(shot_results)
 
     exp_dict = qobj_dict['experiments'][0]
     exp_header = exp_dict['header']
@@ -97,6 +105,12 @@ def _run_with_rigetti_static(qobj_dict, shots, lattice_name, as_qvm, job_id):
     return result
 
 
+def _run_with_checkpoint_static(checkpoint_path, fingerprint, qobj_dict, shots, lattice_name, as_qvm, job_id):
+    result = _run_with_rigetti_static(qobj_dict, shots, lattice_name, as_qvm, job_id)
+    ForestJob._append_checkpoint(checkpoint_path, job_id, fingerprint, result)
+    return result
+
+
 class ForestJob(JobV1):
 
     """
@@ -108,13 +122,42 @@ class ForestJob(JobV1):
     _executor = futures.ThreadPoolExecutor(max_workers=1)
     _run_time = 0
 
-    def __init__(self, backend, job_id, qobj, lattice_name = None, as_qvm = False):
+    """
+    Checkpoint entries are looked up by experiment fingerprint only,
+    so re-assembled qobj (with new qobj_id) resumes from the same file
+    """
+    CHECKPOINT_FILE = "checkpoint.jsonl"
+
+    # columnar result arrays (see `export`)
+    _ARRAY_DTYPES = { 'count_keys': np.uint64,
+                      'count_values': np.int64,
+                      'memory': np.uint64,
+                      'statevector': np.complex128 }
+    # outcomes are stored as uint64
+    _MAX_ARRAY_OUTCOME_BITS = 64
+    _ARRAY_COLUMNS = [ ('count_keys', 'count_offsets'),
+                       ('memory', 'memory_offsets'),
+                       ('statevector', 'statevector_offsets') ]
+
+    def __init__(self, backend, job_id, qobj, lattice_name = None, as_qvm = False, checkpoint_dir = None):
         super().__init__(backend, job_id)
         self._lattice_name = lattice_name
         self._as_qvm = as_qvm
+        self._checkpoint_dir = checkpoint_dir
         self._result = None
         self._qobj_dict = qobj.to_dict()
         self._futures = []
+        """
+        Experiment counters are maintained incrementally
+        so status() doesn't need to scan futures
+        """
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._done = 0
+        self._error = 0
+        self._cancelled = 0
+        self._finished = False
 
 
     def submit(self):
@@ -125,18 +168,95 @@ class ForestJob(JobV1):
         logger.debug("submitting...")
         all_exps = self._qobj_dict
         shots = all_exps['config']['shots']
+        checkpoint_path = None
+        completed = {}
+        if self._checkpoint_dir is not None:
+            os.makedirs(self._checkpoint_dir, exist_ok=True)
+            checkpoint_path = os.path.join(self._checkpoint_dir,
+                ForestJob.CHECKPOINT_FILE)
+            completed = ForestJob._load_checkpoint(checkpoint_path)
         for exp in all_exps["experiments"]:
             single_exp = copy.deepcopy(all_exps)
             single_exp["experiments"]=[exp]
 
-            self._futures.append(self._executor.submit(_run_with_rigetti_static,
-                single_exp,
-                shots,
-                self._lattice_name,
-                self._as_qvm,
-                self._job_id
-                )
-            )
+            if checkpoint_path is None:
+                self._submit_experiment(_run_with_rigetti_static,
+                    single_exp,
+                    shots,
+                    self._lattice_name,
+                    self._as_qvm,
+                    self._job_id
+                    )
+            else:
+                fingerprint = self._experiment_fingerprint(single_exp)
+                if fingerprint in completed:
+                    logger.debug("experiment %s restored from checkpoint", fingerprint)
+                    future = futures.Future()
+                    future.set_result(completed[fingerprint])
+                    with self._lock:
+                        self._done += 1
+                    self._futures.append(future)
+                else:
+                    self._submit_experiment(_run_with_checkpoint_static,
+                        checkpoint_path,
+                        fingerprint,
+                        single_exp,
+                        shots,
+                        self._lattice_name,
+                        self._as_qvm,
+                        self._job_id
+                        )
+        # all experiments may have been restored from checkpoint
+        self._check_finished()
+
+    def _submit_experiment(self, fn, *args):
+        with self._lock:
+            self._queued += 1
+        future = self._executor.submit(self._run_experiment, fn, *args)
+        self._futures.append(future)
+        future.add_done_callback(self._on_experiment_done)
+
+    def _run_experiment(self, fn, *args):
+        """
+        Counters are updated here rather than in done-callback
+        because callbacks run after waiters of the future are
+        released, so wait() could see stale status
+        """
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            result = fn(*args)
+        except BaseException:
+            with self._lock:
+                self._running -= 1
+                self._error += 1
+            self._check_finished()
+            raise
+        with self._lock:
+            self._running -= 1
+            self._done += 1
+        self._check_finished()
+        return result
+
+    def _on_experiment_done(self, future):
+        if not future.cancelled():
+            return
+        with self._lock:
+            self._queued -= 1
+            self._cancelled += 1
+        self._check_finished()
+
+    def _check_finished(self):
+        with self._lock:
+            if self._finished or len(self._futures) < len(self._qobj_dict['experiments']):
+                return
+            if self._queued or self._running:
+                return
+            self._finished = True
+        unregister = getattr(self._backend, "_unregister_job", None)
+        if unregister is not None:
+            unregister(self)
 
     def wait(self, timeout=None):
         if self.status() in [JobStatus.RUNNING, JobStatus.QUEUED] :
@@ -161,7 +281,7 @@ class ForestJob(JobV1):
             }
             ForestJob._run_time += time.time() - self._t_submit
 
-        if len(self._futures)>0:
+        if self._error:
             for f in self._futures:
                 if f.exception() :
                     raise f.exception()
@@ -170,6 +290,100 @@ class ForestJob(JobV1):
         self.wait(timeout)
         return Result.from_dict(self._result);
 
+    def to_arrays(self, timeout=None):
+        """
+        Returns results of all experiments in columnar layout
+        (dict of numpy arrays, see `export` for the description).
+        """
+        exp_arrays = list(self._iter_experiment_arrays(timeout))
+        return ForestJob._concat_arrays(exp_arrays)
+
+    def export(self, path, timeout=None):
+        """
+        Writes results of all experiments into directory `path`,
+        one .npy file per array, so they can be loaded with
+        `numpy.load(filename, mmap_mode='r')`:
+
+        - names: experiment names
+        - count_keys, count_values: integer outcomes and their counts
+        - count_offsets: experiment `i` counts are at
+          `[count_offsets[i]:count_offsets[i+1]]`
+        - memory, memory_offsets: integer outcome of every shot
+          (empty if memory wasn't requested)
+        - statevector, statevector_offsets: complex amplitudes
+          (empty if backend is not "statevector_simulator")
+
+        Outcomes are stored as uint64, so experiments can have at most
+        64 classical bits (qubits for "statevector_simulator"), otherwise
+        JobError is raised.
+
+        Arrays are appended to disk as experiments finish, so export
+        doesn't build the whole columnar result in memory. Note that
+        the job itself still keeps per-experiment results for `result()`.
+        """
+        os.makedirs(path, exist_ok=True)
+        names = []
+        offsets = { offsets_key: [0] for _, offsets_key in ForestJob._ARRAY_COLUMNS }
+        raw_paths = { key: os.path.join(path, key + ".bin") for key in ForestJob._ARRAY_DTYPES }
+        written = []
+        try:
+            raw_files = {}
+            try:
+                for key, raw_path in raw_paths.items():
+                    raw_files[key] = open(raw_path, "wb")
+                for exp in self._iter_experiment_arrays(timeout):
+                    names.append(exp['name'])
+                    for key, offsets_key in ForestJob._ARRAY_COLUMNS:
+                        offsets[offsets_key].append(offsets[offsets_key][-1] + len(exp[key]))
+                    for key in ForestJob._ARRAY_DTYPES:
+                        raw_files[key].write(exp[key].tobytes())
+            finally:
+                for f in raw_files.values():
+                    f.close()
+
+            for key, raw_path in raw_paths.items():
+                npy_path = os.path.join(path, key + ".npy")
+                written.append(npy_path)
+                ForestJob._raw_to_npy(raw_path, npy_path, ForestJob._ARRAY_DTYPES[key])
+            npy_path = os.path.join(path, "names.npy")
+            written.append(npy_path)
+            np.save(npy_path, np.array(names, dtype=np.str_))
+            for offsets_key, values in offsets.items():
+                npy_path = os.path.join(path, offsets_key + ".npy")
+                written.append(npy_path)
+                np.save(npy_path, np.array(values, dtype=np.int64))
+        except BaseException:
+            # don't leave partial export behind
+            for leftover in list(raw_paths.values()) + written:
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            raise
+        return path
+
+    def _iter_experiment_arrays(self, timeout=None):
+        """
+        Yields columnar arrays of each experiment in experiment order,
+        converting each one as soon as it (and all previous ones) finished
+        """
+        if len(self._futures)==0:
+            raise JobError("Job is not submitted!")
+        config = self._qobj_dict['config']
+        outcome_bits = config.get('memory_slots', 0)
+        if self._lattice_name == "statevector_simulator":
+            # counts come from run_and_measure() over all qubits
+            outcome_bits = max(outcome_bits, config.get('n_qubits', 0))
+        if outcome_bits > ForestJob._MAX_ARRAY_OUTCOME_BITS:
+            raise JobError("Columnar export supports at most %d classical bits/qubits, "
+                "experiment has %d" % (ForestJob._MAX_ARRAY_OUTCOME_BITS, outcome_bits))
+        indices = { f: i for i, f in enumerate(self._futures) }
+        finished = {}
+        next_index = 0
+        for f in futures.as_completed(self._futures, timeout):
+            finished[indices[f]] = f
+            while next_index in finished:
+                yield ForestJob._result_to_arrays(finished.pop(next_index).result())
+                next_index += 1
+
     def cancel(self):
         return
 
@@ -178,27 +392,16 @@ class ForestJob(JobV1):
         if len(self._futures)==0 :
             _status = JobStatus.INITIALIZING
         else :
-            running = 0
-            done = 0
-            canceled = 0
-            error = 0
-            queued = 0
-            for f in self._futures:
-                if f.running():
-                    running += 1
-                elif f.cancelled():
-                    canceled += 1
-                elif f.done():
-                    if f.exception() is None:
-                        done += 1
-                    else:
-                        error += 1
-                else:
-                    queued += 1
+            with self._lock:
+                running = self._running
+                done = self._done
+                canceled = self._cancelled
+                error = self._error
+                queued = self._queued
 
             if error :
                 _status = JobStatus.ERROR
-            elif running :
+            elif running or (queued and done) :
                 _status = JobStatus.RUNNING
             elif canceled :
                 _status = JobStatus.CANCELLED
@@ -208,10 +411,87 @@ class ForestJob(JobV1):
                 _status = JobStatus.QUEUED
         return _status
 
+    def progress(self):
+        """
+        Returns fraction (0.0 - 1.0) of finished experiments
+        """
+        total = len(self._qobj_dict['experiments'])
+        if total == 0:
+            return 0.0
+        with self._lock:
+            finished = self._done + self._error + self._cancelled
+        return finished / total
+
+    def experiment_counts(self):
+        """
+        Returns number of queued, running, done, failed
+        and cancelled experiments
+        """
+        with self._lock:
+            return { 'queued': self._queued,
+                     'running': self._running,
+                     'done': self._done,
+                     'error': self._error,
+                     'cancelled': self._cancelled }
+
     def backend(self):
         """Return the instance of the backend used for this job."""
         return self._backend
 
+    def _experiment_fingerprint(self, single_exp):
+        """
+        Hash of everything that affects the result of single experiment
+        """
+        key = {
+            'experiment': single_exp['experiments'][0],
+            'config': single_exp['config'],
+            'lattice_name': self._lattice_name,
+            'as_qvm': self._as_qvm
+        }
+        dump = json.dumps(key, sort_keys=True, default=str)
+        return hashlib.sha256(dump.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _append_checkpoint(checkpoint_path, job_id, fingerprint, result):
+        result = copy.copy(result)
+        data = dict(result['data'])
+        if 'statevector' in data:
+            data['statevector'] = [ [c.real, c.imag] for c in data['statevector'] ]
+        result['data'] = data
+        line = json.dumps({ 'job_id': job_id,
+            'fingerprint': fingerprint,
+            'result': result }, default=str)
+        with open(checkpoint_path, "a") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _load_checkpoint(checkpoint_path):
+        completed = {}
+        if not os.path.exists(checkpoint_path):
+            return completed
+        with open(checkpoint_path, "rb+") as f:
+            content = f.read()
+            if content and not content.endswith(b"\n"):
+                # last line is incomplete if worker died while writing it;
+                # cut it off so the next entry is not appended to it
+                logger.warning("truncating incomplete checkpoint entry in %s", checkpoint_path)
+                content = content[:content.rfind(b"\n") + 1]
+                f.truncate(len(content))
+        for line in content.decode("utf-8").splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                logger.warning("skipping corrupted checkpoint entry in %s", checkpoint_path)
+                continue
+            result = entry['result']
+            data = result['data']
+            if 'statevector' in data:
+                data['statevector'] = [ complex(re, im) for re, im in data['statevector'] ]
+            completed[entry['fingerprint']] = result
+        return completed
+
     @staticmethod
     def _countsarray_to_hex(counts):
         bin=""
@@ -219,6 +499,56 @@ class ForestJob(JobV1):
             bin="%d%s"%(c,bin)
         return hex(int(bin,2))
 
+    @staticmethod
+    def _convert_memory(shot_results):
+        return [ ForestJob._countsarray_to_hex(shot) for shot in shot_results ]
+
+    @staticmethod
+    def _result_to_arrays(result):
+        data = result['data']
+        counts = data.get('counts', {})
+        memory = data.get('memory', [])
+        statevector = data.get('statevector', [])
+        return {
+            'name': result['name'],
+            'count_keys': np.array([ int(k, 16) for k in counts ],
+                dtype=ForestJob._ARRAY_DTYPES['count_keys']),
+            'count_values': np.array(list(counts.values()),
+                dtype=ForestJob._ARRAY_DTYPES['count_values']),
+            'memory': np.array([ int(m, 16) for m in memory ],
+                dtype=ForestJob._ARRAY_DTYPES['memory']),
+            'statevector': np.array(statevector,
+                dtype=ForestJob._ARRAY_DTYPES['statevector'])
+        }
+
+    @staticmethod
+    def _concat_arrays(exp_arrays):
+        ret = { 'names': np.array([ e['name'] for e in exp_arrays ], dtype=np.str_) }
+        for key, offsets_key in ForestJob._ARRAY_COLUMNS:
+            parts = [ e[key] for e in exp_arrays ]
+            offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+            np.cumsum([ len(p) for p in parts ], out=offsets[1:])
+            ret[key] = np.concatenate(parts)
+            ret[offsets_key] = offsets
+        ret['count_values'] = np.concatenate([ e['count_values'] for e in exp_arrays ])
+        return ret
+
+    @staticmethod
+    def _raw_to_npy(raw_path, npy_path, dtype):
+        """
+        Prepends .npy header to raw array data written by `export`
+        """
+        dtype = np.dtype(dtype)
+        length = os.path.getsize(raw_path) // dtype.itemsize
+        header = { 'descr': np.lib.format.dtype_to_descr(dtype),
+                   'fortran_order': False,
+                   'shape': (length,) }
+        with open(npy_path, "wb") as out:
+            np.lib.format.write_array_header_1_0(out, header)
+            with open(raw_path, "rb") as src:
+                shutil.copyfileobj(src, out)
+        os.remove(raw_path)
+
     @staticmethod
     def _convert_counts(counts):
         ret = dict()
@@ -1,9 +1,15 @@
 import unittest
 import warnings
-from quantastica.qiskit_forest import ForestBackend
+import tempfile
+import threading
+import os
+from concurrent import futures
+import numpy as np
+from quantastica.qiskit_forest import ForestBackend, ForestJob
 from qiskit import QuantumRegister, ClassicalRegister
 from qiskit import QuantumCircuit, execute, Aer
 from qiskit.compiler import transpile, assemble
+from qiskit.providers import JobStatus, JobError
 from numpy import pi
 
 class TestForestBackend(unittest.TestCase):
@@ -145,6 +151,201 @@ class TestForestBackend(unittest.TestCase):
         self.assertEqual(len(bell_counts),2)
         self.assertEqual(len(tel_counts),4)
 
+    def test_export_arrays(self):
+        backend = ForestBackend.ForestBackend()
+        qc_list = [ self.get_bell_qc(), self.get_teleport_qc() ]
+        transpiled = transpile(qc_list, backend = backend)
+        qobjs = assemble(transpiled, backend=backend, shots=128, memory=True)
+        job = backend.run(qobjs)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            job.export(tmpdir)
+            offsets = np.load(os.path.join(tmpdir, "count_offsets.npy"))
+            values = np.load(os.path.join(tmpdir, "count_values.npy"), mmap_mode='r')
+            memory_offsets = np.load(os.path.join(tmpdir, "memory_offsets.npy"))
+            self.assertEqual(len(offsets), 3)
+            self.assertEqual(values[offsets[0]:offsets[1]].sum(), 128)
+            self.assertEqual(values[offsets[1]:offsets[2]].sum(), 128)
+            self.assertEqual(list(memory_offsets), [0, 128, 256])
+            exported = { name[:-4]: np.load(os.path.join(tmpdir, name))
+                         for name in os.listdir(tmpdir) }
+        arrays = job.to_arrays()
+        self.assertEqual(sorted(exported), sorted(arrays))
+        for name in arrays:
+            self.assertTrue(np.array_equal(exported[name], arrays[name]))
+        self.assertEqual(list(arrays['names']), ["Bell", "Teleport"])
+        result = job.result()
+        for i, name in enumerate(["Bell", "Teleport"]):
+            hex_counts = result.data(name)['counts']
+            start, end = arrays['count_offsets'][i], arrays['count_offsets'][i+1]
+            counts = dict(zip(arrays['count_keys'][start:end].tolist(),
+                              arrays['count_values'][start:end].tolist()))
+            self.assertEqual(counts, { int(k, 16): v for k, v in hex_counts.items() })
+            """
+            Every shot in memory should be accounted for in counts
+            """
+            start, end = arrays['memory_offsets'][i], arrays['memory_offsets'][i+1]
+            keys, values = np.unique(arrays['memory'][start:end], return_counts=True)
+            self.assertEqual(dict(zip(keys.tolist(), values.tolist())), counts)
+
+    def test_export_timeout_leaves_no_files(self):
+        backend = ForestBackend.ForestBackend()
+        transpiled = transpile(self.get_bell_qc(), backend = backend)
+        qobjs = assemble(transpiled, backend=backend, shots=128)
+        release = threading.Event()
+        blocker = ForestJob.ForestJob._executor.submit(release.wait)
+        try:
+            job = backend.run(qobjs)
+            with tempfile.TemporaryDirectory() as tmpdir:
+                with self.assertRaises(futures.TimeoutError):
+                    job.export(tmpdir, timeout=0.1)
+                self.assertEqual(os.listdir(tmpdir), [])
+        finally:
+            release.set()
+            blocker.result()
+        job.result()
+
+    def test_export_too_many_clbits(self):
+        backend = ForestBackend.ForestBackend()
+        qc = QuantumCircuit(QuantumRegister(1, 'q'), ClassicalRegister(65, 'c'), name="Wide")
+        qc.x(0)
+        qc.measure(0, 64)
+        transpiled = transpile(qc, backend = backend)
+        job = backend.run(assemble(transpiled, backend=backend, shots=8))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with self.assertRaises(JobError):
+                job.export(tmpdir)
+            self.assertEqual(os.listdir(tmpdir), [])
+        job.result()
+
+    def test_checkpoint_resume(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            backend = ForestBackend.ForestBackend(checkpoint_dir = tmpdir)
+            qc_list = [ self.get_bell_qc(), self.get_teleport_qc() ]
+            transpiled = transpile(qc_list, backend = backend)
+            qobjs = assemble(transpiled, backend=backend, shots=256)
+            bell_counts = backend.run(qobjs).result().get_counts("Bell")
+            checkpoint_path = os.path.join(tmpdir, "checkpoint.jsonl")
+            with open(checkpoint_path) as f:
+                lines = f.readlines()
+            self.assertEqual(len(lines), 2)
+            """
+            Simulate worker which died after the first experiment
+            """
+            with open(checkpoint_path, "w") as f:
+                f.write(lines[0])
+            """
+            Re-assembled qobj gets new qobj_id but should still
+            restore first experiment and run only the second one
+            """
+            qobjs = assemble(transpiled, backend=backend, shots=256)
+            result = backend.run(qobjs).result()
+            with open(checkpoint_path) as f:
+                resumed_lines = f.readlines()
+            self.assertEqual(len(resumed_lines), 2)
+            self.assertEqual(resumed_lines[0], lines[0])
+            self.assertEqual(result.get_counts("Bell"), bell_counts)
+            self.assertEqual(len(result.get_counts("Teleport")), 4)
+
+    def test_checkpoint_resume_after_incomplete_entry(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            backend = ForestBackend.ForestBackend(checkpoint_dir = tmpdir)
+            qc_list = [ self.get_bell_qc(), self.get_teleport_qc() ]
+            transpiled = transpile(qc_list, backend = backend)
+            backend.run(assemble(transpiled, backend=backend, shots=256)).result()
+            checkpoint_path = os.path.join(tmpdir, "checkpoint.jsonl")
+            with open(checkpoint_path) as f:
+                lines = f.readlines()
+            """
+            Simulate worker which died while writing the second entry
+            """
+            with open(checkpoint_path, "w") as f:
+                f.write(lines[0])
+                f.write(lines[1][:len(lines[1]) // 2])
+
+            job = backend.run(assemble(transpiled, backend=backend, shots=256))
+            job.result()
+            with open(checkpoint_path) as f:
+                resumed_lines = f.readlines()
+            self.assertEqual(len(resumed_lines), 2)
+            self.assertEqual(resumed_lines[0], lines[0])
+
+            """
+            Entry appended after the resume must be readable,
+            so nothing is recomputed the second time
+            """
+            job = backend.run(assemble(transpiled, backend=backend, shots=256))
+            self.assertEqual(job.experiment_counts()['done'], 2)
+            self.assertEqual(job.experiment_counts()['queued'], 0)
+            job.result()
+            with open(checkpoint_path) as f:
+                self.assertEqual(f.readlines(), resumed_lines)
+
+    def test_progress_and_active_jobs(self):
+        qc_list = [ self.get_bell_qc(), self.get_teleport_qc() ]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            backend = ForestBackend.ForestBackend(checkpoint_dir = tmpdir)
+            transpiled = transpile(qc_list, backend = backend)
+
+            """
+            Block the shared single worker so both experiments stay queued
+            """
+            release = threading.Event()
+            blocker = ForestJob.ForestJob._executor.submit(release.wait)
+            try:
+                job = backend.run(assemble(transpiled, backend=backend, shots=256))
+                self.assertEqual(job.status(), JobStatus.QUEUED)
+                self.assertEqual(backend.active_jobs(), [job])
+                self.assertEqual(job.progress(), 0.0)
+                self.assertEqual(job.experiment_counts()['queued'], 2)
+            finally:
+                release.set()
+                blocker.result()
+            job.result()
+            self.assertEqual(job.status(), JobStatus.DONE)
+            self.assertEqual(job.progress(), 1.0)
+            self.assertEqual(job.experiment_counts()['done'], 2)
+            self.assertEqual(backend.active_jobs(), [])
+
+            """
+            Keep only the first experiment in checkpoint, so the resumed
+            job has one done and one queued experiment
+            """
+            checkpoint_path = os.path.join(tmpdir, "checkpoint.jsonl")
+            with open(checkpoint_path) as f:
+                first_line = f.readline()
+            with open(checkpoint_path, "w") as f:
+                f.write(first_line)
+
+            release = threading.Event()
+            blocker = ForestJob.ForestJob._executor.submit(release.wait)
+            try:
+                job = backend.run(assemble(transpiled, backend=backend, shots=256))
+                self.assertEqual(job.status(), JobStatus.RUNNING)
+                self.assertEqual(backend.active_jobs(), [job])
+                self.assertEqual(job.progress(), 0.5)
+                self.assertEqual(job.experiment_counts()['done'], 1)
+                self.assertEqual(job.experiment_counts()['queued'], 1)
+            finally:
+                release.set()
+                blocker.result()
+            job.result()
+            self.assertEqual(job.status(), JobStatus.DONE)
+            self.assertEqual(job.progress(), 1.0)
+            self.assertEqual(backend.active_jobs(), [])
+
+
+    def test_failed_submit_is_not_active(self):
+        with tempfile.NamedTemporaryFile() as not_a_dir:
+            """
+            Checkpoint dir can't be created over existing file
+            """
+            backend = ForestBackend.ForestBackend(checkpoint_dir = not_a_dir.name)
+            transpiled = transpile(self.get_bell_qc(), backend = backend)
+            qobjs = assemble(transpiled, backend=backend, shots=1)
+            with self.assertRaises(OSError):
+                backend.run(qobjs)
+            self.assertEqual(backend.active_jobs(), [])
+
 
     @staticmethod
     def execute_and_get_stats(backend, qc, shots, seed = None):